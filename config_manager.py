@@ -4,6 +4,7 @@
 配置文件保存于插件目录的上上级的 plugin_data 中。
 安装时若检测到旧版框架配置则迁移，否则按默认配置生成。
 """
+import os
 import json
 import copy
 import shutil
@@ -336,8 +337,13 @@ class PluginConfigManager:
         """保存配置到文件（仅保存到 plugin_data 目录）。"""
         try:
             self.plugin_data_dir.mkdir(parents=True, exist_ok=True)
-            with open(self.config_path, "w", encoding="utf-8") as f:
+            # 先写临时文件再原子替换，避免写入中途崩溃导致配置文件损坏
+            tmp_path = self.config_path.with_name(self.config_path.name + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
                 json.dump(self._config, f, ensure_ascii=False, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.config_path)
         except Exception as e:
             logger.error(f"保存配置文件失败: {e}")
 
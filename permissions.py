@@ -1,6 +1,7 @@
 # permissions.py
-import traceback
-from typing import Optional, List, TYPE_CHECKING
+import time
+import asyncio
+from typing import Optional, List, Dict, Tuple, TYPE_CHECKING
 from astrbot.api import logger
 if TYPE_CHECKING:
     from astrbot.core.platform.sources.aiocqhttp.aiocqhttp_message_event import AiocqhttpMessageEvent
@@ -15,25 +16,23 @@ class PermLevel:
     SUPERUSER = 4
 
 class PermissionManager:
-    """权限管理器单例类"""
+    """权限管理器单例类（仅通过 get_instance 获取）"""
     _instance: Optional["PermissionManager"] = None
 
-    def __new__(cls, *args, **kwargs):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-            cls._instance._initialized = False
-        return cls._instance
-
     def __init__(
         self,
         superusers: Optional[List[str]] = None,
         level_threshold: int = 50,
     ):
-        if self._initialized:
-            return
-        self.superusers = superusers or []
+        # 统一转为字符串并冻结，热路径上只做一次 O(1) 成员判断
+        self.superusers: frozenset = frozenset(str(s) for s in (superusers or []))
         self.level_threshold = level_threshold
-        self._initialized = True
+        # 群成员角色短时缓存：(group_id, user_id) -> (写入时间, role, level)
+        # 缓存原始 role/level 而非权限级别，level_threshold 热更新后无需清空
+        self.cache_ttl = 60.0
+        self._member_cache: Dict[Tuple[int, int], Tuple[float, str, int]] = {}
+        # 同一成员的并发查询合并为一次请求
+        self._inflight: Dict[Tuple[int, int], asyncio.Future] = {}
 
     @classmethod
     def get_instance(
@@ -41,6 +40,7 @@ class PermissionManager:
         superusers: Optional[List[str]] = None,
         level_threshold: int = 50,
     ) -> "PermissionManager":
+        # 创建过程不含 await，在事件循环中天然原子，无需加锁
         if cls._instance is None:
             cls._instance = cls(
                 superusers=superusers,
@@ -48,13 +48,47 @@ class PermissionManager:
             )
         return cls._instance
 
+    async def _get_member_role(
+        self, event: 'AiocqhttpMessageEvent', group_id: int, user_id: int
+    ) -> Optional[Tuple[str, int]]:
+        """获取群成员的 (role, level)，带 TTL 缓存与并发合并；获取失败返回 None。"""
+        key = (group_id, user_id)
+        cached = self._member_cache.get(key)
+        if cached and time.monotonic() - cached[0] < self.cache_ttl:
+            return cached[1], cached[2]
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        result = None
+        try:
+            info = await event.bot.get_group_member_info(group_id=group_id, user_id=user_id)
+            result = (info.get("role", "unknown"), int(info.get("level", 0)))
+            now = time.monotonic()
+            if len(self._member_cache) > 2048:
+                # 顺带清理过期项，防止缓存无限增长
+                self._member_cache = {
+                    k: v for k, v in self._member_cache.items() if now - v[0] < self.cache_ttl
+                }
+            self._member_cache[key] = (now, result[0], result[1])
+        except Exception:
+            pass  # 获取失败（可能不在群里），不缓存
+        finally:
+            del self._inflight[key]
+            fut.set_result(result)
+        return result
+
     async def get_perm_level(
         self, event: 'AiocqhttpMessageEvent', user_id: str | int
     ) -> int:
         """获取用户在群内的权限级别"""
         try:
             # 检查超级用户
-            if str(user_id) in self.superusers:
+            uid_str = str(user_id)
+            if uid_str in self.superusers:
                 return PermLevel.SUPERUSER
 
             group_id = event.get_group_id()
@@ -69,24 +103,18 @@ class PermissionManager:
             # 但为了兼容性，如果转换失败则保持原样或返回 UNKNOWN
             try:
                 group_id_int = int(str(group_id).strip())
-                user_id_int = int(str(user_id).strip())
+                user_id_int = int(uid_str.strip())
             except ValueError:
                 # 非数字ID，无法通过 get_group_member_info 获取信息
                 # 这里可以扩展其他平台的获取方式，目前暂返回 MEMBER
                 return PermLevel.MEMBER
 
-            try:
-                info = await event.bot.get_group_member_info(
-                    group_id=group_id_int, 
-                    user_id=user_id_int, 
-                    no_cache=True
-                )
-            except Exception as e:
+            member = await self._get_member_role(event, group_id_int, user_id_int)
+            if member is None:
                 # 获取失败（可能不在群里），返回 UNKNOWN
                 return PermLevel.UNKNOWN
 
-            role = info.get("role", "unknown")
-            level = int(info.get("level", 0))
+            role, level = member
 
             if role == "owner":
                 return PermLevel.OWNER
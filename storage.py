@@ -5,6 +5,7 @@ import time
 import json
 import asyncio
 import functools
+from collections import OrderedDict
 from pathlib import Path
 from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime, timedelta
@@ -13,11 +14,35 @@ from aiofiles.os import path as aio_path
 from sqlmodel import SQLModel, Field, select, delete, update
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy import text, Index, event, func
 from sqlalchemy.exc import OperationalError as SAOperationalError
 from astrbot.api import logger
 from .utils import is_valid_userid
 
+# 可选依赖：orjson（C 实现，序列化更快），未安装时回退到标准库 json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _dumps_json_bytes(data: Any, indent: bool = False) -> bytes:
+    """序列化为 UTF-8 JSON 字节（保留非 ASCII 字符）。"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(data, ensure_ascii=False, indent=2 if indent else None).encode("utf-8")
+
+
+def _loads_json(content: str) -> Any:
+    """解析 JSON 文本；orjson 更严格（如不接受 NaN），解析失败时回退到标准库再试一次。"""
+    if orjson is not None:
+        try:
+            return orjson.loads(content)
+        except ValueError:
+            pass
+    return json.loads(content)
+
 
 def _retry_on_locked(max_retries: int = 3, base_delay: float = 0.3):
     """装饰器：在遇到 SQLite database is locked 时自动重试。"""
@@ -38,13 +63,23 @@ def _retry_on_locked(max_retries: int = 3, base_delay: float = 0.3):
         return wrapper
     return decorator
 
+# julianday 中 1 秒对应的天数（衰减乐观锁比较互动时间时的容差）
+_ONE_SECOND_DAYS = 1.0 / 86400
+
 # 定义数据库模型
 class FavourRecord(SQLModel, table=True):
     __tablename__ = "favour_records"
-    __table_args__ = {"extend_existing": True}
+    __table_args__ = (
+        # 单条记录点查（get_favour / update_favour / delete_favour 均按 user_id + session_id 定位）；
+        # 唯一约束同时作为 update_favour 中 UPSERT 的冲突目标
+        Index("uq_favour_records_user_session", "user_id", "session_id", unique=True),
+        # 排他关系查询（每次 LLM 请求都会执行）
+        Index("ix_favour_records_session_unique", "session_id", "is_unique"),
+        {"extend_existing": True},
+    )
     
     id: Optional[int] = Field(default=None, primary_key=True)
-    user_id: str = Field(index=True)
+    user_id: str = Field()  # 由 (user_id, session_id) 唯一索引的前缀覆盖，无需单列索引
     session_id: str = Field(default="global", index=True) # "global" 表示全局，或者具体的 session_id
     favour: int = Field(default=0)
     relationship: str = Field(default="")
@@ -66,19 +101,43 @@ class FavourDBManager:
         self.min_val = min_val
         self.max_val = max_val
         
-        # 创建异步引擎（优化 SQLite 并发：限制连接池 + busy timeout）
+        # 创建异步引擎（优化 SQLite 并发：常驻连接池 + busy timeout）
         self.engine = create_async_engine(
             self.db_url, 
             echo=False,
             connect_args={"timeout": 30},  # SQLite busy timeout 30秒，避免 database is locked
-            pool_size=1,       # SQLite 单文件数据库，限制为单连接
+            pool_size=3,       # 常驻连接：WAL 下读写可并行，避免溢出连接反复打开/关闭
             max_overflow=2,    # 允许少量溢出以应对突发并发
+            pool_use_lifo=True,  # 优先复用最近归还的连接，其页缓存/mmap 更热，空闲连接也更少被轮换
         )
+        # 每个新连接建立时设置连接级 PRAGMA（这些设置不会写入数据库文件）
+        event.listen(self.engine.sync_engine, "connect", self._set_sqlite_pragmas)
         self.async_session = sessionmaker(
             self.engine, class_=AsyncSession, expire_on_commit=False
         )
         self._initialized = False
         self._init_lock = asyncio.Lock()
+        # 写入版本号：调用方可据此判断先前读取的记录是否已被改写
+        self._write_versions: Dict[Tuple[str, str], int] = {}
+        self._bulk_version = 0
+        # 全局写入序号 + 上次自动备份时的序号，数据未变时跳过整表导出
+        self._write_seq = 0
+        self._last_auto_backup: Optional[Tuple[int, Path]] = None
+        # get_favour 的进程内 LRU 缓存（None 表示确认不存在），由写入标记统一失效
+        self._cache: "OrderedDict[Tuple[str, str], Optional[FavourRecord]]" = OrderedDict()
+        self._cache_max = 4096
+
+    @staticmethod
+    def _set_sqlite_pragmas(dbapi_conn, connection_record):
+        cursor = dbapi_conn.cursor()
+        try:
+            cursor.execute("PRAGMA synchronous=NORMAL")   # WAL 下 NORMAL 已足够安全，提交时不再每次 fsync
+            cursor.execute("PRAGMA busy_timeout=30000")
+            cursor.execute("PRAGMA cache_size=-20000")    # 约 20MB 页缓存
+            cursor.execute("PRAGMA temp_store=MEMORY")
+            cursor.execute("PRAGMA mmap_size=268435456")  # 256MB 内存映射读，热点页直接走 mmap
+        finally:
+            cursor.close()
 
     def set_limits(self, min_val: int, max_val: int) -> None:
         """热更新好感度边界（供 WebUI 配置保存后调用）。"""
@@ -86,6 +145,32 @@ class FavourDBManager:
         self.max_val = max_val
         logger.debug(f"[DB边界] 好感度上下限已更新为 [{min_val}, {max_val}]")
 
+    def _clamp(self, value: int) -> int:
+        """将好感度限制在 [min_val, max_val] 内（两次比较，省去 min/max 内置调用）。"""
+        if value < self.min_val:
+            return self.min_val
+        if value > self.max_val:
+            return self.max_val
+        return value
+
+    def get_write_version(self, user_id: str, session_id: Optional[str] = None) -> Tuple[int, int]:
+        """返回某条记录当前的写入版本，读取前后版本一致即说明期间没有写入。"""
+        sid = session_id if session_id else "global"
+        return self._bulk_version, self._write_versions.get((user_id, sid), 0)
+
+    def _mark_written(self, user_id: str, sid: str, affects_backup: bool = True) -> None:
+        key = (user_id, sid)
+        self._write_versions[key] = self._write_versions.get(key, 0) + 1
+        if affects_backup:
+            self._write_seq += 1
+        self._cache.pop(key, None)
+
+    def _mark_bulk_written(self) -> None:
+        self._bulk_version += 1
+        self._write_versions.clear()
+        self._write_seq += 1
+        self._cache.clear()
+
     async def init_db(self):
         """初始化数据库表并执行必要的迁移"""
         if self._initialized:
@@ -97,9 +182,8 @@ class FavourDBManager:
                 
             try:
                 async with self.engine.begin() as conn:
-                    # 启用 WAL 模式（提升并发读写性能，减少 database is locked）
+                    # 启用 WAL 模式（提升并发读写性能，减少 database is locked；持久化到数据库文件）
                     await conn.execute(text("PRAGMA journal_mode=WAL"))
-                    await conn.execute(text("PRAGMA busy_timeout=30000"))
                     
                     # 检查表是否存在
                     result = await conn.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name='favour_records'"))
@@ -127,10 +211,54 @@ class FavourDBManager:
                             logger.info("数据库升级完成（username）。")
                             #################
 
+                    # 旧库补建索引（新库由 create_all 创建）
+                    result = await conn.execute(text(
+                        "SELECT name FROM sqlite_master WHERE type='index' "
+                        "AND name='uq_favour_records_user_session'"
+                    ))
+                    if result.scalar() is None:
+                        # 建唯一索引前先去重：同一 (user_id, session_id) 只保留最早的一条（与以往读取到的记录一致）
+                        keep_ids = select(func.min(FavourRecord.id)).group_by(
+                            FavourRecord.user_id, FavourRecord.session_id
+                        )
+                        result = await conn.execute(
+                            select(FavourRecord.__table__).where(FavourRecord.id.not_in(keep_ids))
+                        )
+                        duplicates = [FavourRecord(**row._mapping) for row in result]
+                        if duplicates:
+                            # 被删除的重复记录先完整备份，备份失败则中止升级，绝不在无备份的情况下删除数据
+                            backup_file = await self.backup_data(duplicates, "pre_dedup")
+                            if not backup_file:
+                                raise RuntimeError("重复记录备份失败，已中止唯一索引升级")
+                            await conn.execute(
+                                delete(FavourRecord).where(FavourRecord.id.not_in(keep_ids))
+                            )
+                            logger.warning(
+                                f"正在升级数据库：清理了 {len(duplicates)} 条重复的好感度记录，"
+                                f"原记录已备份至 {backup_file}"
+                            )
+                        await conn.execute(text(
+                            "CREATE UNIQUE INDEX uq_favour_records_user_session "
+                            "ON favour_records (user_id, session_id)"
+                        ))
+                    # user_id 单列索引已被唯一复合索引的前缀覆盖，旧库中删除以减少写入时的索引维护
+                    await conn.execute(text("DROP INDEX IF EXISTS ix_favour_records_user_id"))
+                    await conn.execute(text(
+                        "CREATE INDEX IF NOT EXISTS ix_favour_records_session_unique "
+                        "ON favour_records (session_id, is_unique)"
+                    ))
+
                 self._initialized = True
                 logger.info(f"好感度数据库已初始化: {self.db_path}")
             except Exception as e:
+                # 不能吞掉异常：初始化未完成时唯一索引可能缺失，后续 UPSERT 都会失败，须让调用方感知
                 logger.error(f"数据库初始化失败: {e}")
+                raise
+
+    async def close(self):
+        """释放连接池（插件卸载时调用）。"""
+        await self.engine.dispose()
+        logger.debug("好感度数据库连接池已释放。")
 
     async def migrate_from_json(self, json_path: Path, is_global: bool = False):
         """从旧版JSON文件迁移数据"""
@@ -141,52 +269,80 @@ class FavourDBManager:
         try:
             async with aio_open(json_path, "r", encoding="utf-8") as f:
                 content = await f.read()
-                data = json.loads(content)
+                data = _loads_json(content)
 
-            count = 0
+            # 单次查询载入已有键，再整批插入新行，避免逐行 SELECT 的往返开销
+            now = datetime.now()
+            rows: List[dict] = []
             async with self.async_session() as session:
+                result = await session.execute(
+                    select(FavourRecord.user_id, FavourRecord.session_id)
+                )
+                existing = set(result.all())
+
                 if is_global:
                     if isinstance(data, dict):
                         for uid, fav in data.items():
-                            stmt = select(FavourRecord).where(
-                                FavourRecord.user_id == str(uid),
-                                FavourRecord.session_id == "global"
-                            )
-                            result = await session.execute(stmt)
-                            if not result.scalars().first():
-                                record = FavourRecord(
-                                    user_id=str(uid),
-                                    session_id="global",
-                                    favour=int(fav)
-                                )
-                                session.add(record)
-                                count += 1
+                            key = (str(uid), "global")
+                            if key in existing:
+                                continue
+                            existing.add(key)
+                            rows.append({
+                                "user_id": key[0],
+                                "session_id": "global",
+                                "favour": int(fav),
+                                "relationship": "",
+                                "is_unique": False,
+                                "username": "",
+                                "created_at": now,
+                                "updated_at": now,
+                                "last_interaction": now,
+                            })
                 else:
                     if isinstance(data, list):
                         for item in data:
-                            uid = str(item.get("userid", ""))
-                            sid = str(item.get("session_id", "")) or "global"
+                            # 快速路径：旧文件中的字段通常已是正确类型，只在类型不符时才转换
+                            uid = item.get("userid", "")
+                            if type(uid) is not str:
+                                uid = str(uid)
+                            sid = item.get("session_id", "")
+                            if type(sid) is not str:
+                                sid = str(sid)
+                            sid = sid or "global"
                             if not uid: continue
                             
-                            stmt = select(FavourRecord).where(
-                                FavourRecord.user_id == uid,
-                                FavourRecord.session_id == sid
-                            )
-                            result = await session.execute(stmt)
-                            if not result.scalars().first():
-                                record = FavourRecord(
-                                    user_id=uid,
-                                    session_id=sid,
-                                    favour=int(item.get("favour", 0)),
-                                    relationship=str(item.get("relationship", "")),
-                                    is_unique=bool(item.get("is_unique", False))
-                                )
-                                session.add(record)
-                                count += 1
+                            key = (uid, sid)
+                            if key in existing:
+                                continue
+                            existing.add(key)
+                            fav = item.get("favour", 0)
+                            rel = item.get("relationship", "")
+                            uniq = item.get("is_unique", False)
+                            rows.append({
+                                "user_id": uid,
+                                "session_id": sid,
+                                "favour": fav if type(fav) is int else int(fav),
+                                "relationship": rel if type(rel) is str else str(rel),
+                                "is_unique": uniq if type(uniq) is bool else bool(uniq),
+                                "username": "",
+                                "created_at": now,
+                                "updated_at": now,
+                                "last_interaction": now,
+                            })
                 
-                await session.commit()
+                if rows:
+                    # 键已在内存中去重（库内已有 + 文件内重复）；ON CONFLICT DO NOTHING 作为唯一索引下的兜底
+                    await session.execute(
+                        sqlite_insert(FavourRecord).on_conflict_do_nothing(
+                            index_elements=["user_id", "session_id"]
+                        ),
+                        rows,
+                    )
+                    await session.commit()
+            count = len(rows)
             
             if count > 0:
+                self._mark_bulk_written()
                 logger.info(f"成功从 {json_path.name} 迁移了 {count} 条数据到数据库")
                 backup_path = json_path.with_suffix(".json.bak")
                 import shutil
@@ -216,8 +372,14 @@ class FavourDBManager:
                 d['last_interaction'] = d['last_interaction'].isoformat() if d.get('last_interaction') else None
                 data_to_save.append(d)
                 
-            async with aio_open(filename, "w", encoding="utf-8") as f:
-                await f.write(json.dumps(data_to_save, ensure_ascii=False, indent=2))
+            # 先写临时文件再原子替换，写入中途崩溃也不会留下半截备份
+            tmp_path = filename.with_name(filename.name + ".tmp")
+            async with aio_open(tmp_path, "wb") as f:
+                await f.write(_dumps_json_bytes(data_to_save, indent=True))
+                await f.flush()
+                # 落盘后再替换，避免断电后留下“已改名但内容为空”的备份；fsync 放到线程里以免阻塞事件循环
+                await asyncio.to_thread(os.fsync, f.fileno())
+            os.replace(tmp_path, filename)
             return str(filename)
         except Exception as e:
             logger.error(f"备份数据失败: {e}")
@@ -227,13 +389,41 @@ class FavourDBManager:
         """获取好感度记录"""
         await self.init_db()
         sid = session_id if session_id else "global"
+        key = (user_id, sid)
+        cache = self._cache
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+
+        version = self.get_write_version(user_id, sid)
         async with self.async_session() as session:
             stmt = select(FavourRecord).where(
                 FavourRecord.user_id == user_id,
                 FavourRecord.session_id == sid
             )
             result = await session.execute(stmt)
-            return result.scalars().first()
+            record = result.scalars().first()
+
+        # 查询期间若有写入，结果可能已过期，不放入缓存
+        if self.get_write_version(user_id, sid) == version:
+            cache[key] = record
+            if len(cache) > self._cache_max:
+                cache.popitem(last=False)
+        return record
+
+    @staticmethod
+    async def _select_favours(session: AsyncSession, user_ids: List[str], sid: str) -> Dict[str, FavourRecord]:
+        """在给定会话内按 user_id IN (...) 批量读取，分块以避开 SQLite 绑定变量上限。"""
+        found: Dict[str, FavourRecord] = {}
+        for i in range(0, len(user_ids), 900):
+            stmt = select(FavourRecord).where(
+                FavourRecord.user_id.in_(user_ids[i:i + 900]),
+                FavourRecord.session_id == sid
+            )
+            result = await session.execute(stmt)
+            for record in result.scalars():
+                found[record.user_id] = record
+        return found
 
     @_retry_on_locked()
     async def update_favour(
@@ -253,39 +443,37 @@ class FavourDBManager:
         sid = session_id if session_id else "global"
         
         try:
-            async with self.async_session() as session:
-                stmt = select(FavourRecord).where(
-                    FavourRecord.user_id == user_id,
-                    FavourRecord.session_id == sid
-                )
-                result = await session.execute(stmt)
-                record = result.scalars().first()
+            # 单条 INSERT ... ON CONFLICT DO UPDATE：一次往返完成“不存在则创建、存在则更新”
+            now = datetime.now()
+            clamped = self._clamp(favour) if favour is not None else None
+            stmt = sqlite_insert(FavourRecord).values(
+                user_id=user_id,
+                session_id=sid,
+                favour=clamped if clamped is not None else 0,
+                relationship=relationship or "",
+                is_unique=is_unique if is_unique is not None else False,
+                username="",
+                created_at=now,
+                updated_at=now,
+                last_interaction=now,
+            )
+            set_ = {"updated_at": now}
+            if clamped is not None:
+                set_["favour"] = clamped
+            if relationship is not None:
+                set_["relationship"] = relationship
+            if is_unique is not None:
+                set_["is_unique"] = is_unique
+            if touch_interaction:
+                set_["last_interaction"] = now
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["user_id", "session_id"], set_=set_
+            )
 
-                now = datetime.now()
-                if not record:
-                    init_favour = max(self.min_val, min(self.max_val, favour)) if favour is not None else 0
-                    record = FavourRecord(
-                        user_id=user_id,
-                        session_id=sid,
-                        favour=init_favour,
-                        relationship=relationship or "",
-                        is_unique=is_unique if is_unique is not None else False,
-                        last_interaction=now
-                    )
-                    session.add(record)
-                else:
-                    if favour is not None:
-                        record.favour = max(self.min_val, min(self.max_val, favour))
-                    if relationship is not None:
-                        record.relationship = relationship
-                    if is_unique is not None:
-                        record.is_unique = is_unique
-                    record.updated_at = now
-                    if touch_interaction:
-                        record.last_interaction = now
-                    session.add(record)
-                
+            async with self.async_session() as session:
+                await session.execute(stmt)
                 await session.commit()
+                self._mark_written(user_id, sid)
                 return True
         except Exception as e:
             logger.error(f"更新数据库失败: {str(e)}")
@@ -305,19 +493,20 @@ class FavourDBManager:
             return 0
             
         try:
-            async with self.async_session() as session:
-                values = {"updated_at": datetime.now()}
-                if favour is not None:
-                    values["favour"] = max(self.min_val, min(self.max_val, favour))
-                if relationship is not None:
-                    values["relationship"] = relationship
-                if is_unique is not None:
-                    values["is_unique"] = is_unique
-                
-                stmt = update(FavourRecord).where(FavourRecord.user_id == user_id).values(**values)
-                result = await session.execute(stmt)
-                await session.commit()
-                return result.rowcount
+            values = {"updated_at": datetime.now()}
+            if favour is not None:
+                values["favour"] = self._clamp(favour)
+            if relationship is not None:
+                values["relationship"] = relationship
+            if is_unique is not None:
+                values["is_unique"] = is_unique
+            
+            # 单条 UPDATE 直接在 Core 连接的事务中执行，无需 ORM 会话
+            stmt = update(FavourRecord).where(FavourRecord.user_id == user_id).values(**values)
+            async with self.engine.begin() as conn:
+                result = await conn.execute(stmt)
+            self._mark_bulk_written()
+            return result.rowcount
         except Exception as e:
             logger.error(f"全局更新失败: {str(e)}")
             return 0
@@ -341,6 +530,7 @@ class FavourDBManager:
                 
                 await session.delete(record)
                 await session.commit()
+                self._mark_written(user_id, sid)
                 return True, "删除成功"
         except Exception as e:
             logger.error(f"删除记录失败: {str(e)}")
@@ -355,6 +545,34 @@ class FavourDBManager:
             result = await session.execute(stmt)
             return list(result.scalars().all())
 
+    async def get_unique_relationships(self, session_id: Optional[str] = None) -> List[Tuple[str, str]]:
+        """获取某会话下所有排他性关系，仅返回 (user_id, relationship)"""
+        await self.init_db()
+        sid = session_id if session_id else "global"
+        async with self.async_session() as session:
+            stmt = select(FavourRecord.user_id, FavourRecord.relationship).where(
+                FavourRecord.session_id == sid,
+                FavourRecord.is_unique == True,
+                FavourRecord.relationship != ""
+            )
+            result = await session.execute(stmt)
+            return [(row[0], row[1]) for row in result.all()]
+
+    async def get_session_relationships(self, session_id: Optional[str] = None,
+                                        exclude_user_id: Optional[str] = None) -> List[Tuple[str, str, int]]:
+        """获取某会话下所有已建立关系的用户，仅返回 (user_id, relationship, favour)"""
+        await self.init_db()
+        sid = session_id if session_id else "global"
+        async with self.async_session() as session:
+            stmt = select(FavourRecord.user_id, FavourRecord.relationship, FavourRecord.favour).where(
+                FavourRecord.session_id == sid,
+                FavourRecord.relationship != ""
+            )
+            if exclude_user_id:
+                stmt = stmt.where(FavourRecord.user_id != exclude_user_id)
+            result = await session.execute(stmt)
+            return [(row[0], row[1], row[2]) for row in result.all()]
+
     async def get_global_records(self) -> List[FavourRecord]:
         """获取所有共享记录（旧版 'global' 和新版适配器前缀如 'aiocqhttp'）。
         共享记录的 session_id 不包含 ':'。"""
@@ -385,6 +603,12 @@ class FavourDBManager:
             result = await session.execute(stmt)
             return list(result.scalars().all())
 
+    async def get_record_by_id(self, record_id: int) -> Optional[FavourRecord]:
+        """按主键获取单条记录（供 WebUI 数据管理使用）"""
+        await self.init_db()
+        async with self.async_session() as session:
+            return await session.get(FavourRecord, record_id)
+
     @_retry_on_locked()
     async def update_record(self, record_id: int, **kwargs) -> bool:
         """更新指定记录的字段（favour, relationship, username 等）"""
@@ -392,9 +616,20 @@ class FavourDBManager:
         await self.init_db()
         try:
             async with self.async_session() as session:
-                stmt = update(FavourRecord).where(FavourRecord.id == record_id).values(**kwargs)
+                # 先取出记录键，只失效这一条的缓存与写入版本（用户名等高频写入不应清空全部缓存）
+                result = await session.execute(
+                    select(FavourRecord.user_id, FavourRecord.session_id).where(FavourRecord.id == record_id)
+                )
+                key = result.first()
+                stmt = (
+                    update(FavourRecord).where(FavourRecord.id == record_id).values(**kwargs)
+                    .execution_options(synchronize_session=False)
+                )
                 await session.execute(stmt)
                 await session.commit()
+            if key is not None:
+                # 仅更新展示用昵称（每条新昵称消息都会触发）不计入备份脏计数，否则自动备份几乎无法跳过
+                self._mark_written(key[0], key[1], affects_backup=not kwargs.keys() <= {"username"})
             return True
         except Exception as e:
             logger.error(f"更新记录 {record_id} 失败: {e}")
@@ -407,9 +642,10 @@ class FavourDBManager:
         await self.init_db()
         try:
             async with self.async_session() as session:
-                stmt = delete(FavourRecord).where(FavourRecord.id == record_id)
+                stmt = delete(FavourRecord).where(FavourRecord.id == record_id).execution_options(synchronize_session=False)
                 await session.execute(stmt)
                 await session.commit()
+            self._mark_bulk_written()
             return True
         except Exception as e:
             logger.error(f"删除记录 {record_id} 失败: {e}")
@@ -422,9 +658,10 @@ class FavourDBManager:
         sid = session_id if session_id else "global"
         try:
             async with self.async_session() as session:
-                stmt = delete(FavourRecord).where(FavourRecord.session_id == sid)
+                stmt = delete(FavourRecord).where(FavourRecord.session_id == sid).execution_options(synchronize_session=False)
                 await session.execute(stmt)
                 await session.commit()
+                self._mark_bulk_written()
                 return True
         except Exception as e:
             logger.error(f"清空会话记录失败: {str(e)}")
@@ -436,9 +673,10 @@ class FavourDBManager:
         await self.init_db()
         try:
             async with self.async_session() as session:
-                stmt = delete(FavourRecord)
+                stmt = delete(FavourRecord).execution_options(synchronize_session=False)
                 await session.execute(stmt)
                 await session.commit()
+                self._mark_bulk_written()
                 return True
         except Exception as e:
             logger.error(f"清空所有记录失败: {str(e)}")
@@ -462,77 +700,120 @@ class FavourDBManager:
         
         mode = decay_config.get("mode", "linear") if decay_config else "linear"
         floor_favour = decay_config.get("floor_favour") if decay_config else None
+        # 时间基准与规则排序对本轮所有记录相同，在循环外计算一次
+        now = datetime.now()
+        if mode == "linear":
+            if inactive_days is None:
+                inactive_days = 7
+            linear_cutoff = now - timedelta(days=inactive_days)
+        else:
+            rules = decay_config.get("advanced_rules", []) if decay_config else []
+            if not rules:
+                return results
+            # 按 min_favour 降序排列以优先匹配高区间
+            rules_sorted = sorted(rules, key=lambda r: r.get("min_favour", 0), reverse=True)
         
         try:
             async with self.async_session() as session:
-                # 获取所有好感度高于 min_val 的记录
-                stmt = select(FavourRecord).where(FavourRecord.favour > self.min_val)
-                result = await session.execute(stmt)
-                all_records = list(result.scalars().all())
-            
-            for record in all_records:
-                if mode == "linear":
-                    if inactive_days is None:
-                        inactive_days = 7
-                    cutoff = datetime.now() - timedelta(days=inactive_days)
-                    if record.last_interaction and record.last_interaction < cutoff:
-                        # 检查底线
-                        eff_floor = floor_favour if floor_favour is not None else self.min_val
-                        if record.favour > eff_floor:
-                            decay_amt = decay_config.get("decay_amount", 5) if decay_config else 5
-                            results.append((record, inactive_days, decay_amt))
-                else:
-                    # 分级模式：按 advanced_rules 匹配
-                    rules = decay_config.get("advanced_rules", []) if decay_config else []
-                    if not rules:
-                        continue
-                    # 按 min_favour 降序排列以优先匹配高区间
-                    rules_sorted = sorted(rules, key=lambda r: r.get("min_favour", 0), reverse=True)
-                    matched_rule = None
-                    for rule in rules_sorted:
-                        r_min = rule.get("min_favour", -999)
-                        r_max = rule.get("max_favour", 999)
-                        if r_min <= record.favour <= r_max:
-                            matched_rule = rule
-                            break
-                    
-                    if matched_rule:
-                        days = matched_rule.get("inactive_days", 7)
-                        cutoff = datetime.now() - timedelta(days=days)
-                        if record.last_interaction and record.last_interaction < cutoff:
-                            eff_floor = matched_rule.get("floor", floor_favour)
-                            if eff_floor is None:
-                                eff_floor = floor_favour if floor_favour is not None else self.min_val
+                # 获取所有好感度高于 min_val 的记录；分批流式读取，只保留命中的候选，避免整表物化为列表
+                stmt = select(FavourRecord).where(
+                    FavourRecord.favour > self.min_val
+                ).execution_options(yield_per=500)
+                stream = await session.stream_scalars(stmt)
+                async for record in stream:
+                    if mode == "linear":
+                        if record.last_interaction and record.last_interaction < linear_cutoff:
+                            # 检查底线
+                            eff_floor = floor_favour if floor_favour is not None else self.min_val
                             if record.favour > eff_floor:
-                                decay_amt = matched_rule.get("decay_amount", 5)
-                                results.append((record, days, decay_amt))
+                                decay_amt = decay_config.get("decay_amount", 5) if decay_config else 5
+                                results.append((record, inactive_days, decay_amt))
+                    else:
+                        # 分级模式：按 advanced_rules 匹配
+                        matched_rule = None
+                        for rule in rules_sorted:
+                            r_min = rule.get("min_favour", -999)
+                            r_max = rule.get("max_favour", 999)
+                            if r_min <= record.favour <= r_max:
+                                matched_rule = rule
+                                break
+                    
+                        if matched_rule:
+                            days = matched_rule.get("inactive_days", 7)
+                            cutoff = now - timedelta(days=days)
+                            if record.last_interaction and record.last_interaction < cutoff:
+                                eff_floor = matched_rule.get("floor", floor_favour)
+                                if eff_floor is None:
+                                    eff_floor = floor_favour if floor_favour is not None else self.min_val
+                                if record.favour > eff_floor:
+                                    decay_amt = matched_rule.get("decay_amount", 5)
+                                    results.append((record, days, decay_amt))
         except Exception as e:
             logger.error(f"查询衰减候选记录失败: {e}")
         
         return results
 
     @_retry_on_locked()
-    async def apply_decay(self, user_id: str, session_id: str, decay_amount: int, floor: int = None) -> Optional[int]:
+    async def apply_decay_batch(
+        self, items: List[Tuple[FavourRecord, int]], floor: int = None
+    ) -> List[Tuple[FavourRecord, int]]:
         """
-        对指定记录应用衰减，返回衰减后的好感度值。
-        若已达到底线则不再衰减，返回 None 表示无变化。
+        批量应用衰减：所有记录在同一事务中更新，只提交一次。
+        每条 UPDATE 以扫描时读到的 favour 与 last_interaction（按时间值比较）为条件（乐观并发），
+        扫描之后若该记录已被聊天更新或刷新了互动时间，则跳过，不会覆盖新值。
+        Returns: 实际发生变化的 (record, new_favour) 列表
         """
-        record = await self.get_favour(user_id, session_id)
-        if not record:
-            return None
-        
+        await self.init_db()
         eff_floor = floor if floor is not None else self.min_val
-        if record.favour <= eff_floor:
-            return None
-        
-        new_favour = max(eff_floor, record.favour - decay_amount)
-        await self.update_favour(user_id, session_id, favour=new_favour, touch_interaction=False)
-        return new_favour
+        now = datetime.now()
+        pending: List[Tuple[FavourRecord, int]] = []
+        for record, decay_amount in items:
+            if record.favour <= eff_floor:
+                continue
+            pending.append((record, self._clamp(max(eff_floor, record.favour - decay_amount))))
+        if not pending:
+            return []
+
+        changed: List[Tuple[FavourRecord, int]] = []
+        try:
+            async with self.engine.begin() as conn:
+                for record, new_favour in pending:
+                    # last_interaction 按 julianday 比较而非字符串相等：旧数据/导入数据的时间格式可能不同（如秒级精度），
+                    # 允许 1 秒误差；扫描后互动时间被刷新则必然超出该范围
+                    stmt = update(FavourRecord).where(
+                        FavourRecord.id == record.id,
+                        FavourRecord.favour == record.favour,
+                        func.julianday(FavourRecord.last_interaction)
+                        <= func.julianday(record.last_interaction) + _ONE_SECOND_DAYS,
+                    ).values(favour=new_favour, updated_at=now)
+                    result = await conn.execute(stmt)
+                    if result.rowcount == 1:
+                        changed.append((record, new_favour))
+        except Exception as e:
+            logger.error(f"批量衰减失败: {e}")
+            return []
+        if len(changed) < len(pending):
+            logger.debug(f"[衰减] {len(pending) - len(changed)} 条记录在扫描后已被更新，本轮跳过")
+        self._mark_bulk_written()
+        return changed
 
-    async def auto_backup(self) -> Optional[str]:
-        """自动备份所有记录"""
+    async def auto_backup(self, force: bool = False) -> Optional[str]:
+        """自动备份所有记录；自上次自动备份以来无任何写入时跳过（force=True 强制备份）"""
+        seq = self._write_seq
+        last = self._last_auto_backup
+        if not force and last is not None and last[0] == seq and last[1].exists():
+            # 数据未变化：刷新上次备份的时间戳，避免被过期清理删掉，而不是重新导出整表
+            try:
+                os.utime(last[1], None)
+                logger.debug(f"[自动备份] 数据自上次备份后未变化，跳过: {last[1].name}")
+                return None
+            except OSError:
+                pass
         records = await self.get_all_records()
-        return await self.backup_data(records, "auto")
+        path = await self.backup_data(records, "auto")
+        if path:
+            self._last_auto_backup = (seq, Path(path))
+        return path
 
     async def list_backups(self) -> List[dict]:
         """列出所有备份文件"""
@@ -581,7 +862,7 @@ class FavourDBManager:
         try:
             async with aio_open(backup_path, "r", encoding="utf-8") as f:
                 content = await f.read()
-                data = json.loads(content)
+                data = _loads_json(content)
             
             if not isinstance(data, list):
                 return False, "备份文件格式无效"
@@ -590,14 +871,19 @@ class FavourDBManager:
             async with self.async_session() as session:
                 async with session.begin():
                     # 删除所有现有记录
-                    await session.execute(delete(FavourRecord))
+                    await session.execute(delete(FavourRecord).execution_options(synchronize_session=False))
                     
-                    # 插入备份中的记录
+                    # 插入备份中的记录（旧版备份可能含重复键，只保留首条以满足唯一索引）
+                    seen = set()
                     for item in data:
+                        key = (item.get("user_id", ""), item.get("session_id", "global"))
+                        if key in seen:
+                            continue
+                        seen.add(key)
                         record = FavourRecord(
                             id=item.get("id"),
-                            user_id=item.get("user_id", ""),
-                            session_id=item.get("session_id", "global"),
+                            user_id=key[0],
+                            session_id=key[1],
                             favour=item.get("favour", 0),
                             relationship=item.get("relationship", ""),
                             is_unique=item.get("is_unique", False),
@@ -608,6 +894,7 @@ class FavourDBManager:
                         )
                         session.add(record)
             
+            self._mark_bulk_written()
             return True, f"restored {len(data)} records"
         except Exception as e:
             logger.error(f"恢复备份失败: {e}")
@@ -641,7 +928,8 @@ class FavourDBManager:
         cleaned = 0
         
         for f in backup_dir.iterdir():
-            if f.is_file() and f.suffix == ".json":
+            # pre_dedup_ 是升级去重时被删除记录的唯一副本，不随保留期清理
+            if f.is_file() and f.suffix == ".json" and not f.name.startswith("pre_dedup_"):
                 try:
                     age = now - os.path.getmtime(str(f))
                     if age > max_age_seconds:
@@ -658,12 +946,16 @@ class FavourDBManager:
     async def list_sessions(self) -> List[Dict[str, Any]]:
         """列出所有有数据的会话及其记录数。"""
         await self.init_db()
-        records = await self.get_all_records()
-        counts: Dict[str, int] = {}
-        for r in records:
-            counts[r.session_id] = counts.get(r.session_id, 0) + 1
+        # 由数据库分组计数，不再为每条记录构造 ORM 对象
+        async with self.async_session() as session:
+            stmt = (
+                select(FavourRecord.session_id, func.count())
+                .group_by(FavourRecord.session_id)
+                .order_by(func.count().desc(), FavourRecord.session_id)
+            )
+            rows = (await session.execute(stmt)).all()
         result = []
-        for sid, cnt in sorted(counts.items(), key=lambda x: (-x[1], x[0])):
+        for sid, cnt in rows:
             parts = sid.split(":", 2)
             result.append({
                 "session_id": sid,
@@ -722,17 +1014,18 @@ class FavourDBManager:
                 if mode == "replace":
                     await session.execute(
                         delete(FavourRecord).where(FavourRecord.session_id == target_sid)
+                        .execution_options(synchronize_session=False)
                     )
 
+                # 一次性取出目标会话中已存在的对应用户，替代逐条 SELECT
+                targets = {} if mode == "replace" else await self._select_favours(
+                    session, [src.user_id for src in source_records], target_sid
+                )
+
                 affected = 0
                 now = datetime.now()
                 for src in source_records:
-                    stmt = select(FavourRecord).where(
-                        FavourRecord.user_id == src.user_id,
-                        FavourRecord.session_id == target_sid,
-                    )
-                    result = await session.execute(stmt)
-                    existing = result.scalars().first()
+                    existing = targets.get(src.user_id)
                     if existing:
                         existing.favour = src.favour
                         existing.relationship = src.relationship or ""
@@ -740,7 +1033,6 @@ class FavourDBManager:
                         existing.username = src.username or existing.username or ""
                         existing.updated_at = now
                         existing.last_interaction = src.last_interaction or existing.last_interaction
-                        session.add(existing)
                     else:
                         session.add(FavourRecord(
                             user_id=src.user_id,
@@ -756,6 +1048,7 @@ class FavourDBManager:
                     affected += 1
 
                 await session.commit()
+            self._mark_bulk_written()
 
             msg = f"已将 {affected} 条记录从 {source_sid} 复制到 {target_sid}（模式={mode}）"
             logger.info(f"[会话复制] {msg}")
@@ -0,0 +1,50 @@
+import importlib.util
+import logging
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("sqlmodel")
+pytest.importorskip("aiosqlite")
+pytest.importorskip("aiofiles")
+
+PLUGIN_DIR = Path(__file__).resolve().parent.parent
+PKG_NAME = "favour_ultra_under_test"
+
+
+def _ensure_astrbot_logger():
+    """存储层只依赖 astrbot.api.logger；未安装 AstrBot 时用标准 logging 顶替。"""
+    try:
+        import astrbot.api  # noqa: F401
+        return
+    except ImportError:
+        pass
+    astrbot = types.ModuleType("astrbot")
+    api = types.ModuleType("astrbot.api")
+    api.logger = logging.getLogger("astrbot")
+    astrbot.api = api
+    sys.modules.setdefault("astrbot", astrbot)
+    sys.modules.setdefault("astrbot.api", api)
+
+
+def _load_storage():
+    _ensure_astrbot_logger()
+    if PKG_NAME not in sys.modules:
+        pkg = types.ModuleType(PKG_NAME)
+        pkg.__path__ = [str(PLUGIN_DIR)]
+        sys.modules[PKG_NAME] = pkg
+    name = f"{PKG_NAME}.storage"
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, PLUGIN_DIR / "storage.py")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="session")
+def storage():
+    return _load_storage()
@@ -0,0 +1,19 @@
+import asyncio
+
+
+def test_auto_backup_skips_when_only_usernames_changed(storage, tmp_path):
+    async def scenario():
+        db = storage.FavourDBManager(tmp_path)
+        await db.update_favour("u1", "s1", favour=10)
+        first = await db.auto_backup()
+        assert first
+
+        record = await db.get_favour("u1", "s1")
+        await db.update_record(record.id, username="Alice")
+        assert await db.auto_backup() is None
+
+        await db.update_favour("u1", "s1", favour=11)
+        assert await db.auto_backup() is not None
+        await db.close()
+
+    asyncio.run(scenario())
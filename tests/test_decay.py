@@ -0,0 +1,62 @@
+import asyncio
+import sqlite3
+from datetime import datetime, timedelta
+
+
+def _insert_raw(db_path, user_id, session_id, favour, last_interaction):
+    """绕过 ORM 直接写入，模拟旧版/导入数据的时间格式（秒级精度）。"""
+    ts = last_interaction.strftime("%Y-%m-%d %H:%M:%S")
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute(
+            "INSERT INTO favour_records (user_id, session_id, favour, relationship, is_unique, "
+            "username, created_at, updated_at, last_interaction) VALUES (?, ?, ?, '', 0, '', ?, ?, ?)",
+            (user_id, session_id, favour, ts, ts, ts),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_decay_applies_to_second_precision_timestamps(storage, tmp_path):
+    async def scenario():
+        db = storage.FavourDBManager(tmp_path)
+        await db.init_db()
+        _insert_raw(db.db_path, "u1", "s1", 50, datetime.now() - timedelta(days=30))
+
+        candidates = await db.get_decay_candidates(inactive_days=7)
+        assert len(candidates) == 1
+        decayed = await db.apply_decay_batch([(r, amt) for r, _, amt in candidates])
+        assert [(r.user_id, fav) for r, fav in decayed] == [("u1", 45)]
+        assert (await db.get_favour("u1", "s1")).favour == 45
+        await db.close()
+
+    _run(scenario())
+
+
+def test_decay_skips_rows_written_after_scan(storage, tmp_path):
+    async def scenario():
+        db = storage.FavourDBManager(tmp_path)
+        await db.init_db()
+        old = datetime.now() - timedelta(days=30)
+        _insert_raw(db.db_path, "u1", "s1", 50, old)
+        _insert_raw(db.db_path, "u2", "s1", 50, old)
+
+        candidates = await db.get_decay_candidates(inactive_days=7)
+        assert len(candidates) == 2
+
+        # 扫描之后：u1 好感度被聊天改写，u2 只刷新了互动时间
+        await db.update_favour("u1", "s1", favour=80)
+        await db.update_favour("u2", "s1")
+
+        decayed = await db.apply_decay_batch([(r, amt) for r, _, amt in candidates])
+        assert decayed == []
+        assert (await db.get_favour("u1", "s1")).favour == 80
+        assert (await db.get_favour("u2", "s1")).favour == 50
+        await db.close()
+
+    _run(scenario())
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import sqlite3
+
+import pytest
+
+# 旧版（唯一索引之前）的表结构：只有 user_id / session_id 单列索引，允许同键多行
+_OLD_SCHEMA = """
+CREATE TABLE favour_records (
+    id INTEGER NOT NULL PRIMARY KEY,
+    user_id VARCHAR NOT NULL,
+    session_id VARCHAR NOT NULL,
+    favour INTEGER NOT NULL,
+    relationship VARCHAR NOT NULL,
+    is_unique BOOLEAN NOT NULL,
+    username VARCHAR NOT NULL,
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME NOT NULL,
+    last_interaction DATETIME NOT NULL
+);
+CREATE INDEX ix_favour_records_user_id ON favour_records (user_id);
+CREATE INDEX ix_favour_records_session_id ON favour_records (session_id);
+"""
+
+_TS = "2024-01-01 12:00:00.000000"
+
+
+def _build_old_db(db_path, rows):
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executescript(_OLD_SCHEMA)
+        conn.executemany(
+            "INSERT INTO favour_records (id, user_id, session_id, favour, relationship, is_unique, "
+            "username, created_at, updated_at, last_interaction) VALUES (?, ?, ?, ?, ?, 0, '', ?, ?, ?)",
+            [(rid, uid, sid, fav, rel, _TS, _TS, _TS) for rid, uid, sid, fav, rel in rows],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _indexes(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return {
+            name: unique
+            for name, unique in (
+                (row[1], row[2]) for row in conn.execute("PRAGMA index_list(favour_records)")
+            )
+        }
+    finally:
+        conn.close()
+
+
+def test_upgrade_dedups_with_backup_and_creates_unique_index(storage, tmp_path):
+    _build_old_db(tmp_path / "favour.db", [
+        (1, "u1", "s1", 10, "朋友"),
+        (2, "u1", "s1", 90, "恋人"),
+        (3, "u1", "s1", 50, ""),
+        (4, "u2", "s1", 20, ""),
+    ])
+
+    async def scenario():
+        db = storage.FavourDBManager(tmp_path)
+        await db.init_db()
+        records = sorted(await db.get_all_records(), key=lambda r: r.id)
+        backups = await db.list_backups()
+        await db.close()
+        return records, backups
+
+    records, backups = asyncio.run(scenario())
+
+    # 每个键只保留最早的一条（与升级前读取到的记录一致）
+    assert [(r.id, r.user_id, r.favour, r.relationship) for r in records] == [
+        (1, "u1", 10, "朋友"),
+        (4, "u2", 20, ""),
+    ]
+
+    # 被删除的行完整写入 pre_dedup 备份，且在 WebUI 列表中可见
+    pre_dedup = list((tmp_path / "backups").glob("pre_dedup_*.json"))
+    assert len(pre_dedup) == 1
+    assert pre_dedup[0].name in {b["filename"] for b in backups}
+    saved = json.loads(pre_dedup[0].read_text(encoding="utf-8"))
+    assert sorted((d["id"], d["favour"], d["relationship"]) for d in saved) == [
+        (2, 90, "恋人"),
+        (3, 50, ""),
+    ]
+
+    indexes = _indexes(tmp_path / "favour.db")
+    assert indexes.get("uq_favour_records_user_session") == 1
+    assert "ix_favour_records_user_id" not in indexes
+
+
+def test_pre_dedup_backup_survives_retention_cleanup(storage, tmp_path):
+    _build_old_db(tmp_path / "favour.db", [
+        (1, "u1", "s1", 10, ""),
+        (2, "u1", "s1", 20, ""),
+    ])
+
+    async def scenario():
+        db = storage.FavourDBManager(tmp_path)
+        await db.init_db()
+        await db.cleanup_old_backups(max_age_hours=0)
+        await db.close()
+
+    asyncio.run(scenario())
+    assert len(list((tmp_path / "backups").glob("pre_dedup_*.json"))) == 1
+
+
+def test_upgrade_without_duplicates_writes_no_backup(storage, tmp_path):
+    _build_old_db(tmp_path / "favour.db", [
+        (1, "u1", "s1", 10, ""),
+        (2, "u1", "s2", 20, ""),
+    ])
+
+    async def scenario():
+        db = storage.FavourDBManager(tmp_path)
+        await db.init_db()
+        count = len(await db.get_all_records())
+        await db.close()
+        return count
+
+    assert asyncio.run(scenario()) == 2
+    assert not (tmp_path / "backups").exists() or not list((tmp_path / "backups").iterdir())
+    assert _indexes(tmp_path / "favour.db").get("uq_favour_records_user_session") == 1
+
+
+def test_update_favour_upsert_creates_then_updates_supplied_fields(storage, tmp_path):
+    async def scenario():
+        db = storage.FavourDBManager(tmp_path, min_val=-100, max_val=100)
+        assert await db.update_favour("u1", "s1", favour=30, relationship="朋友")
+        created = await db.get_favour("u1", "s1")
+
+        # 只传 favour：relationship 保持不变，越界值被钳制，仍是同一行
+        assert await db.update_favour("u1", "s1", favour=500)
+        updated = await db.get_favour("u1", "s1")
+
+        records = await db.get_all_records()
+        await db.close()
+        return created, updated, records
+
+    created, updated, records = asyncio.run(scenario())
+    assert (created.favour, created.relationship) == (30, "朋友")
+    assert (updated.id, updated.favour, updated.relationship) == (created.id, 100, "朋友")
+    assert len(records) == 1
+
+
+def test_upgrade_aborts_without_deleting_when_backup_fails(storage, tmp_path):
+    _build_old_db(tmp_path / "favour.db", [
+        (1, "u1", "s1", 10, ""),
+        (2, "u1", "s1", 20, ""),
+    ])
+    # backups 被同名文件占用，备份目录无法创建
+    (tmp_path / "backups").write_text("", encoding="utf-8")
+
+    async def scenario():
+        db = storage.FavourDBManager(tmp_path)
+        try:
+            with pytest.raises(RuntimeError):
+                await db.init_db()
+        finally:
+            await db.close()
+
+    asyncio.run(scenario())
+    conn = sqlite3.connect(tmp_path / "favour.db")
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM favour_records").fetchone()[0] == 2
+    finally:
+        conn.close()
+    assert "uq_favour_records_user_session" not in _indexes(tmp_path / "favour.db")
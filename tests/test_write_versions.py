@@ -0,0 +1,23 @@
+import asyncio
+
+
+def test_update_record_only_invalidates_its_own_key(storage, tmp_path):
+    async def scenario():
+        db = storage.FavourDBManager(tmp_path)
+        await db.update_favour("u1", "s1", favour=10)
+        await db.update_favour("u2", "s1", favour=20)
+        r1 = await db.get_favour("u1", "s1")
+        await db.get_favour("u2", "s1")
+        v1 = db.get_write_version("u1", "s1")
+        v2 = db.get_write_version("u2", "s1")
+
+        assert await db.update_record(r1.id, username="Alice")
+
+        assert db.get_write_version("u1", "s1") != v1
+        assert db.get_write_version("u2", "s1") == v2
+        assert ("u1", "s1") not in db._cache
+        assert ("u2", "s1") in db._cache
+        assert (await db.get_favour("u1", "s1")).username == "Alice"
+        await db.close()
+
+    asyncio.run(scenario())
@@ -1,12 +1,14 @@
 # utils.py
 import string
 
+# 用户ID允许的字符（模块加载时构建一次）
+_ALLOWED_USERID_CHARS = frozenset(string.ascii_letters + string.digits + "_-:@.")
+
 def is_valid_userid(userid: str) -> bool:
     """验证用户ID格式是否有效"""
-    if not userid or len(userid.strip()) == 0:
+    if not userid:
         return False
     userid = userid.strip()
-    if len(userid) > 64:
+    if not userid or len(userid) > 64:
         return False
-    allowed_chars = string.ascii_letters + string.digits + "_-:@."
-    return all(c in allowed_chars for c in userid)
+    return _ALLOWED_USERID_CHARS.issuperset(userid)